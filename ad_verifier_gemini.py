@@ -1,9 +1,19 @@
 import streamlit as st
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from selectolax.lexbor import LexborHTMLParser
 import google.generativeai as genai
-import json
+from google.generativeai import client as genai_client
+import orjson
 import os
+import hashlib
+import threading
+import time
+import re
+import textwrap
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Page Config ---
 st.set_page_config(
@@ -27,165 +37,354 @@ st.title("🛡️ AdGPT Anti-Hallucination Guard")
 st.markdown("Ensure your ad copy is grounded in reality and consistent with your brand voice.")
 
 # --- Inputs ---
-col1, col2 = st.columns(2)
-with col1:
-    gemini_key = st.text_input("Google Gemini API Key", type="password", help="Get yours at aistudio.google.com")
-with col2:
-    target_url = st.text_input("Target URL", placeholder="https://www.example.com")
+# A form so typing doesn't rerun the script; only submitting does
+with st.form("verify_form"):
+    col1, col2 = st.columns(2)
+    with col1:
+        gemini_key = st.text_input("Google Gemini API Key", type="password", help="Get yours at aistudio.google.com")
+    with col2:
+        target_url = st.text_input("Target URL", placeholder="https://www.example.com", help="Separate multiple URLs with spaces to verify against each page.")
 
-ad_script = st.text_area("Generated Ad Script", height=150, placeholder="Paste the AI-generated ad copy here...")
+    ad_script = st.text_area("Generated Ad Script", height=150, placeholder="Paste the AI-generated ad copy here...")
 
-verify_btn = st.button("Verify Script", type="primary")
+    verify_btn = st.form_submit_button("Verify Script", type="primary")
 
 # --- Logic ---
 
+# Truncate site text to avoid token limits if extremely large, though Flash has ~1M context. Safe guard at 30k chars for now for speed/safety.
+MAX_CONTEXT_CHARS = 30000
+# Upper bound on how much of a page we download before parsing
+MAX_HTML_BYTES = 2_000_000
+
+PROMPT_TEMPLATE = textwrap.dedent("""\
+    You are a strict compliance and quality control officer for advertising.
+    
+    Your task is to verify an 'Ad Script' against the ground truth text from a 'Source Website'.
+    
+    Step 1: Analyize the 'Source Website Text' to understand the facts, features, and tone.
+    Step 2: Check the 'Ad Script' for any factual hallucinations (claims not supported by the website).
+    Step 3: Analyze if the tone of the ad matches the website's voice.
+    Step 4: Assign a quality score from 0-100.
+    
+    Return a valid JSON object ONLY. Do not use Markdown code blocks.
+    Structure:
+    {{
+        "score": (integer 0-100),
+        "hallucinations": ["string list of specific claims in the ad that exist nowhere on the site"],
+        "tone_consistency": "Brief analysis of whether the ad voice matches the site voice",
+        "verdict": "PASS" (if score > 80 and no major hallucinations) or "FAIL"
+    }}
+    
+    ---
+    Source Website Text:
+    {site} 
+    
+    ---
+    Ad Script:
+    {ad}
+""")
+
+# JSON schema for the verdict, mirroring the structure described in PROMPT_TEMPLATE
+RESULT_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'score': {'type': 'INTEGER'},
+        'hallucinations': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+        'tone_consistency': {'type': 'STRING'},
+        'verdict': {'type': 'STRING', 'format': 'enum', 'enum': ['PASS', 'FAIL']},
+    },
+    'required': ['score', 'hallucinations', 'tone_consistency', 'verdict'],
+}
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+@st.cache_resource
+def get_session():
+    """Shared HTTP session so repeat scrapes reuse pooled keep-alive connections."""
+    session = requests.Session()
+    # Ask for compressed HTML (br needs the brotli package, which urllib3 picks up automatically)
+    session.headers.update({'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip, deflate, br'})
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504)),
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+_MULTISPACE = re.compile(r'[ \t]{2,}')
+# Every separator str.splitlines() breaks on, not just \n
+_LINEBREAK = re.compile(r'\s*[\n\r\x0b\x0c\x1c-\x1e\x85\u2028\u2029]\s*')
+
+@st.cache_data(ttl=3600, max_entries=128, show_spinner=False)
 def scrape_website(url):
-    """Scrapes all visible text from the target URL."""
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(url, headers=headers, timeout=10)
+    """Scrapes all visible text from the target URL.
+
+    Results are cached per URL; errors propagate so failures are never cached.
+    """
+    # Stream the body and stop after MAX_HTML_BYTES so huge pages can't blow up memory or parse time
+    with get_session().get(url, stream=True, timeout=10) as response:
         response.raise_for_status()
+        body = response.raw.read(MAX_HTML_BYTES, decode_content=True)
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        encoding = response.encoding or 'utf-8'
+    
+    if content_type in ('', 'text/html', 'application/xhtml+xml'):
+        # selectolax (lexbor backend) parses and extracts text in C; passing bytes lets it sniff the encoding itself
+        tree = LexborHTMLParser(body)
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.extract()
+        # Remove non-visible elements
+        for node in tree.css('script, style, noscript, template'):
+            node.decompose()
             
-        text = soup.get_text()
-        
-        # Break into lines and remove leading/trailing space on each
-        lines = (line.strip() for line in text.splitlines())
-        # Break multi-headlines into a line each
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        # Drop blank lines
-        text = '\n'.join(chunk for chunk in chunks if chunk)
-        
-        return text
+        root = tree.body or tree.root
+        # No separator, like get_text(): inline nodes such as <b>$9</b> must stay inside their sentence
+        text = root.text(separator='') if root else ''
+    elif content_type == 'application/json' or content_type.endswith('+json'):
+        # No DOM to build; re-serialize compactly so indentation doesn't eat into the context budget
+        try:
+            text = orjson.dumps(orjson.loads(body)).decode()
+        except orjson.JSONDecodeError:
+            text = body.decode(encoding, errors='replace')
+    elif content_type.startswith('text/'):
+        text = body.decode(encoding, errors='replace')
+    else:
+        raise ValueError(f"Unsupported content type: {content_type}")
+    
+    # Break multi-headlines into a line each, then trim every line and drop blank ones
+    text = _LINEBREAK.sub('\n', _MULTISPACE.sub('\n', text)).strip()
+    
+    # Only the first MAX_CONTEXT_CHARS reach the prompt, so don't keep (or cache) the rest
+    return text[:MAX_CONTEXT_CHARS]
+
+# genai.configure() is process-wide, so configuring a key and using it must not interleave across sessions
+_GENAI_LOCK = threading.Lock()
+
+@st.cache_data(ttl=86400, show_spinner=False)
+def resolve_model_name(api_key_hash, _api_key):
+    """Dynamically finds the best available model supporting generateContent.
+
+    Cached for a day per hashed API key (the raw key is excluded from the cache key),
+    since the models available to a key rarely change.
+    """
+    try:
+        with _GENAI_LOCK:
+            genai.configure(api_key=_api_key)
+            models = list(genai.list_models())
     except Exception as e:
-        return f"ERROR: {str(e)}"
+        raise RuntimeError(f"Error listing models: {str(e)}") from e
+    # Filter for generateContent support
+    valid_models = [m for m in models if 'generateContent' in m.supported_generation_methods]
+    
+    if not valid_models:
+        raise RuntimeError("Could not find a valid model. No models found that support generateContent.")
+    
+    # Priority: Flash -> Pro -> Any
+    chosen = (
+        next((m for m in valid_models if "flash" in m.name.lower()), None)
+        or next((m for m in valid_models if "pro" in m.name.lower()), None)
+        or valid_models[0]
+    )
+    return chosen.name
+
+@st.cache_resource(show_spinner=False)
+def build_model(api_key_hash, model_name, _api_key):
+    """Builds the GenerativeModel once per API key and model name.
+
+    The SDK would otherwise bind whichever key is configured at the first generate_content call,
+    so the client is bound here, under the lock, to this key.
+    """
+    # Structured output mode: the API guarantees the response is raw JSON matching RESULT_SCHEMA
+    generation_config = genai.types.GenerationConfig(
+        response_mime_type='application/json',
+        response_schema=RESULT_SCHEMA,
+    )
+    model = genai.GenerativeModel(model_name, generation_config=generation_config)
+    with _GENAI_LOCK:
+        genai.configure(api_key=_api_key)
+        model._client = genai_client.get_default_generative_client()
+    return model
+
+def hash_api_key(api_key):
+    """Stable cache key for an API key, so the raw key never becomes part of a cache key."""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+def get_model(api_key):
+    """Returns a ``(GenerativeModel, model_name)`` tuple for the API key."""
+    api_key_hash = hash_api_key(api_key)
+    model_name = resolve_model_name(api_key_hash, api_key)
+    return build_model(api_key_hash, model_name, api_key), model_name
+
+# Parsed verdicts are reused for an hour, keeping at most this many
+VERIFICATION_TTL = 3600
+VERIFICATION_MAX_ENTRIES = 256
+
+@st.cache_resource
+def verification_cache():
+    """LRU of parsed verdicts shared across sessions, as ``key -> (stored_at, result)``.
+
+    Kept in a resource rather than st.cache_data so that misses can still stream into the page.
+    """
+    return OrderedDict(), threading.Lock()
+
+def _cache_get(key):
+    cache, lock = verification_cache()
+    with lock:
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > VERIFICATION_TTL:
+            del cache[key]
+            return None
+        cache.move_to_end(key)
+        return entry[1]
+
+def _cache_put(key, result):
+    cache, lock = verification_cache()
+    with lock:
+        cache[key] = (time.monotonic(), result)
+        cache.move_to_end(key)
+        while len(cache) > VERIFICATION_MAX_ENTRIES:
+            cache.popitem(last=False)
+
+def _digest(text):
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+class UnparseableResponse(ValueError):
+    """Gemini answered, but not with valid JSON; ``raw`` holds the response text."""
+
+    def __init__(self, raw, error):
+        super().__init__(str(error))
+        self.raw = raw
+
+def analyze(model, api_key_hash, site_text, ad_script, on_chunk=None):
+    """Asks Gemini to grade the ad script against the site text; returns the parsed verdict.
+
+    If ``on_chunk`` is given the response is streamed and it is called with the text received so far.
+    Identical (key, site, ad, model) checks are answered from ``verification_cache`` without calling Gemini.
+    Raises ``UnparseableResponse`` if the answer is not valid JSON.
+    """
+    key = (api_key_hash, _digest(site_text), _digest(ad_script), model.model_name)
+    result = _cache_get(key)
+    if result is not None:
+        return result
+    
+    prompt = PROMPT_TEMPLATE.format_map({'site': site_text, 'ad': ad_script})
+    
+    if on_chunk is None:
+        text_resp = model.generate_content(prompt).text
+    else:
+        buf = []
+        for chunk in model.generate_content(prompt, stream=True):
+            buf.append(chunk.text)
+            on_chunk(''.join(buf))
+        text_resp = ''.join(buf)
+    
+    try:
+        result = parse_result(text_resp)
+    except ValueError as e:
+        raise UnparseableResponse(text_resp, e) from e
+    _cache_put(key, result)
+    return result
+
+def parse_result(text_resp):
+    """Parses the JSON verdict out of a raw Gemini response."""
+    return orjson.loads(text_resp)
+
+def render_result(result):
+    """Displays a parsed verdict."""
+    # Score
+    st.metric(label="Quality Score", value=result.get("score", 0))
+    
+    # Verdict
+    verdict = result.get("verdict", "FAIL").upper()
+    if verdict == "PASS":
+        st.success(f"Verdict: {verdict}")
+    else:
+        st.error(f"Verdict: {verdict}")
+    
+    # Tone
+    st.markdown("### Tone Analysis")
+    st.write(result.get("tone_consistency", "N/A"))
+    
+    # Hallucinations
+    hallucinations = result.get("hallucinations", [])
+    if hallucinations:
+        st.error("### ⚠️ Potential Hallucinations Detected")
+        for h in hallucinations:
+            st.write(f"- {h}")
+    elif verdict == "PASS":
+         st.success("No factual hallucinations detected.")
+
+def verify_batch(model, api_key_hash, urls, ad_script, max_concurrency=5):
+    """Verifies the ad script against several URLs concurrently.
+
+    Scraping and the Gemini call are both network-bound, so a thread pool
+    overlaps them across URLs. Returns ``(url, result, error, raw_response)`` tuples in input
+    order; ``raw_response`` is set when Gemini answered but the answer could not be parsed.
+    """
+    def run(url):
+        try:
+            return url, analyze(model, api_key_hash, scrape_website(url), ad_script), None, None
+        except Exception as e:
+            return url, None, e, getattr(e, 'raw', None)
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(urls))) as pool:
+        return list(pool.map(run, urls))
 
 if verify_btn:
+    # Whitespace only: commas are legal inside URLs (e.g. query strings)
+    target_urls = target_url.split()
     if not gemini_key:
         st.error("Please enter your Google Gemini API Key.")
-    elif not target_url:
+    elif not target_urls:
         st.error("Please enter a Target URL.")
     elif not ad_script:
         st.error("Please enter the Ad Script.")
+    elif len(target_urls) > 1:
+        with st.spinner(f"Verifying against {len(target_urls)} pages with Gemini 2.5 Flash..."):
+            try:
+                model, model_name = get_model(gemini_key)
+                results = verify_batch(model, hash_api_key(gemini_key), target_urls, ad_script)
+            except Exception as e:
+                st.error(f"Analysis failed: {str(e)}")
+                results = []
+        if results:
+            st.info(f"Using model: **{model_name}**")
+        for url, result, error, text_resp in results:
+            st.subheader(url)
+            if error is not None:
+                st.error(f"Verification failed: {str(error)}")
+                if text_resp is not None:
+                    st.write("Raw response (for debugging):")
+                    st.code(text_resp)
+            else:
+                render_result(result)
     else:
+        site_text = None
         with st.spinner("Scraping website..."):
-            site_text = scrape_website(target_url)
+            try:
+                site_text = scrape_website(target_urls[0])
+            except Exception as e:
+                st.error(f"Failed to scrape website: {str(e)}")
         
-        if site_text.startswith("ERROR:"):
-            st.error(f"Failed to scrape website: {site_text}")
-        else:
+        if site_text is not None:
             with st.spinner("Analyzing with Gemini 2.5 Flash..."):
                 try:
-                    # Configure Gemini
-                    genai.configure(api_key=gemini_key)
-                    
-                    def get_best_model():
-                        """Dynamically finds the best available model supporting generateContent."""
-                        try:
-                            models = list(genai.list_models())
-                            # Filter for generateContent support
-                            valid_models = [m for m in models if 'generateContent' in m.supported_generation_methods]
-                            
-                            if not valid_models:
-                                return None, "No models found that support generateContent."
-                            
-                            # Priority: Flash -> Pro -> Any
-                            flash_model = next((m for m in valid_models if "flash" in m.name.lower()), None)
-                            if flash_model:
-                                return flash_model.name, [m.name for m in valid_models]
-                                
-                            pro_model = next((m for m in valid_models if "pro" in m.name.lower()), None)
-                            if pro_model:
-                                return pro_model.name, [m.name for m in valid_models]
-                                
-                            return valid_models[0].name, [m.name for m in valid_models]
-                        except Exception as e:
-                            return None, f"Error listing models: {str(e)}"
-
-                    model_name, debug_info = get_best_model()
+                    model, model_name = get_model(gemini_key)
+                    st.info(f"Using model: **{model_name}**")
                     
-                    if not model_name:
-                        st.error(f"Could not find a valid model. Debug info: {debug_info}")
-                    else:
-                        st.info(f"Using model: **{model_name}**")
-                        model = genai.GenerativeModel(model_name)
+                    # Show the response as it streams in, then swap it for the rendered verdict
+                    live_output = st.empty()
+                    result = analyze(model, hash_api_key(gemini_key), site_text, ad_script, on_chunk=live_output.code)
+                    live_output.empty()
                     
-                        # Construction Prompt
-                        prompt = f"""
-                        You are a strict compliance and quality control officer for advertising.
-                        
-                        Your task is to verify an 'Ad Script' against the ground truth text from a 'Source Website'.
-                        
-                        Step 1: Analyize the 'Source Website Text' to understand the facts, features, and tone.
-                        Step 2: Check the 'Ad Script' for any factual hallucinations (claims not supported by the website).
-                        Step 3: Analyze if the tone of the ad matches the website's voice.
-                        Step 4: Assign a quality score from 0-100.
-                        
-                        Return a valid JSON object ONLY. Do not use Markdown code blocks.
-                        Structure:
-                        {{
-                            "score": (integer 0-100),
-                            "hallucinations": ["string list of specific claims in the ad that exist nowhere on the site"],
-                            "tone_consistency": "Brief analysis of whether the ad voice matches the site voice",
-                            "verdict": "PASS" (if score > 80 and no major hallucinations) or "FAIL"
-                        }}
-                        
-                        ---
-                        Source Website Text:
-                        {site_text[:30000]} 
-                        
-                        ---
-                        Ad Script:
-                        {ad_script}
-                        """
-                        # Truncate site text to avoid token limits if extremely large, though Flash has ~1M context. Safe guard at 30k chars for now for speed/safety.
-                        
-                        response = model.generate_content(prompt)
-                        
-                        # Clean response if necessary (Gemini sometimes adds ```json ... ```)
-                        text_resp = response.text.strip()
-                        if text_resp.startswith("```"):
-                            parts = text_resp.split("```")
-                            if len(parts) >= 2:
-                                text_resp = parts[1]
-                                if text_resp.startswith("json"):
-                                     text_resp = text_resp[4:]
-                        text_resp = text_resp.strip()
-                        
-                        result = json.loads(text_resp)
-                        
-                        # --- Results Display ---
-                        
-                        # Score
-                        st.metric(label="Quality Score", value=result.get("score", 0))
-                        
-                        # Verdict
-                        verdict = result.get("verdict", "FAIL").upper()
-                        if verdict == "PASS":
-                            st.success(f"Verdict: {verdict}")
-                        else:
-                            st.error(f"Verdict: {verdict}")
-                        
-                        # Tone
-                        st.markdown("### Tone Analysis")
-                        st.write(result.get("tone_consistency", "N/A"))
-                        
-                        # Hallucinations
-                        hallucinations = result.get("hallucinations", [])
-                        if hallucinations:
-                            st.error("### ⚠️ Potential Hallucinations Detected")
-                            for h in hallucinations:
-                                st.write(f"- {h}")
-                        elif verdict == "PASS":
-                             st.success("No factual hallucinations detected.")
+                    # --- Results Display ---
+                    render_result(result)
 
                 except Exception as e:
                     st.error(f"Analysis failed: {str(e)}")
                     st.write("Raw response (for debugging):")
-                    if 'response' in locals():
-                        st.code(response.text)
+                    if isinstance(e, UnparseableResponse):
+                        st.code(e.raw)